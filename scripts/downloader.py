@@ -15,6 +15,7 @@ import argparse
 from pathlib import Path
 from slugify import slugify
 from rich.progress import Progress
+from sharding import assignments, parse_shard, run_shard, shard_name
 
 # Accepted file suffixes
 RDF_SUFFIXES = ["rdf", "ttl", "owl", "n3", "nt", "jsonld", "nq", "trig", "trix"]
@@ -64,44 +65,114 @@ def file_name(url: str, directory_path: str) -> str:
     return file_name
 
 
-def download_from_url(url: str, folder: str, file_name: str) -> bool:
+def validators_of(response) -> dict:
+    """HTTP headers used to check if a resource changed since it has been downloaded"""
+    return {
+        "etag": response.headers.get("etag"),
+        "lastModified": response.headers.get("last-modified"),
+        "contentLength": response.headers.get("content-length"),
+    }
+
+
+def is_unchanged(validators: dict, response) -> bool:
+    """Checks if the resource in the response is the same described by the validators,
+    used for servers that ignore conditional requests and always answer with the content
+    """
+    current = validators_of(response)
+
+    if validators.get("etag") is not None and current["etag"] is not None:
+        return validators["etag"] == current["etag"]
+
+    if validators.get("lastModified") is not None and current["lastModified"] is not None:
+        return (
+            validators["lastModified"] == current["lastModified"]
+            and validators.get("contentLength") == current["contentLength"]
+        )
+
+    return False
+
+
+def download_from_url(
+    url: str, folder: str, file_name: str, validators: dict = None
+) -> dict:
     """Downloads the resource from the given URL
 
     Args:
         url (str): URL that contains the item to be downloaded
         folder (str): target folder in which the downloaded item will be saved
         file_name (str): name of the downloaded file
+        validators (dict): validators stored by a previous download, if given the resource is downloaded only if it changed
 
     Returns:
-        bool: True if the download has been completed without errors, otherwise an exception is thrown
+        dict: validators of the downloaded resource, None if it did not change. If something goes wrong an exception is thrown
     """
 
-    response = requests.get(url, stream=True)
+    headers = dict()
+    if validators is not None:
+        if validators.get("etag") is not None:
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("lastModified") is not None:
+            headers["If-Modified-Since"] = validators["lastModified"]
+
+    response = requests.get(url, stream=True, headers=headers)
+
+    if response.status_code == 304:
+        response.close()
+        return None
+
     response.raise_for_status()
 
+    if validators is not None and is_unchanged(validators, response):
+        response.close()
+        return None
+
     download_path = folder + f"/{file_name}"
     Path(folder).mkdir(parents=True, exist_ok=True)
 
     # Create a progress bar to track progress while downloading
     total_size_in_bytes = int(response.headers.get("content-length", 0))
 
-    with (
-        Progress(expand=True) as progress_bar,
-        open(download_path, "wb") as target,
-    ):
-        print(f"Downloading {url}")
-        task = progress_bar.add_task(
-            f"[green]Downloading...", total=total_size_in_bytes
-        )
+    # download to a temporary file so that a failure does not corrupt a previous download
+    partial_path = f"{download_path}.part"
+
+    try:
+        with (
+            Progress(expand=True) as progress_bar,
+            open(partial_path, "wb") as target,
+        ):
+            print(f"Downloading {url}")
+            task = progress_bar.add_task(
+                f"[green]Downloading...", total=total_size_in_bytes
+            )
 
-        for data in response.iter_content():
-            progress_bar.update(task, advance=len(data))
-            target.write(data)
+            for data in response.iter_content(chunk_size=1024 * 1024):
+                progress_bar.update(task, advance=len(data))
+                target.write(data)
 
-    return True
+        os.replace(partial_path, download_path)
 
+    finally:
+        # remove what is left of a failed transfer
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
 
-def process_dataset(index: int, entry: dict, folder: str):
+    return validators_of(response)
+
+
+def process_dataset(
+    index: int, entry: dict, folder: str, refresh: bool = False
+) -> tuple:
+    """Downloads the files of a dataset and writes its `metadata.json`
+
+    Args:
+        index (int): index of the dataset in the collection
+        entry (dict): dataset as reported in `datasets.json`
+        folder (str): folder in which datasets are downloaded
+        refresh (bool): download again only the files that changed since the previous download
+
+    Returns:
+        tuple: True if at least one file has been downloaded, and the list of URLs that cannot be downloaded
+    """
     global log
 
     dataset_id = entry["dataset_id"]
@@ -114,19 +185,64 @@ def process_dataset(index: int, entry: dict, folder: str):
 
     download_folder = f"{folder}/{dataset_id}"
 
+    # file in which the data will be stored
+    outfile = f"{download_folder}/metadata.json"
+
+    # check if data file already exists
+    data_file_already_exists = os.path.isfile(outfile)
+
+    # when refreshing start from what has been stored by the previous download
+    data = dict()
+    previous_entries = dict()
+    if refresh and data_file_already_exists:
+        with open(outfile, "r") as f:
+            data = json.load(f, strict=False)
+        previous_entries = {e["url"]: e for e in data.get("downloadedURLs", list())}
+
     # download attached files
     downloaded_entries = list()
     failed_urls = list()
+    changed = False
     for url in dataset_urls:
+        previous = previous_entries.get(url)
+
         try:
-            downloaded_file_name = file_name(url, download_folder)
-            download_from_url(url, download_folder, downloaded_file_name)
+            if previous is not None:
+                # download again on the same file only if the resource changed,
+                # unconditionally if the file has been deleted in the meantime
+                downloaded_file_name = previous["name"]
+                file_exists = os.path.isfile(f"{download_folder}/{downloaded_file_name}")
+                validators = download_from_url(
+                    url,
+                    download_folder,
+                    downloaded_file_name,
+                    previous if file_exists else None,
+                )
+            else:
+                downloaded_file_name = file_name(url, download_folder)
+                validators = download_from_url(url, download_folder, downloaded_file_name)
+
+            if validators is None:
+                downloaded_entries.append(previous)
+                log.info(f"[Dataset ID: {dataset_id}] url: {url} not modified")
+                continue
+
+            changed = True
 
             # save the downloaded file into the downloaded entry
-            downloaded_entries.append({"url": url, "name": downloaded_file_name})
+            downloaded_entries.append(
+                {"url": url, "name": downloaded_file_name, **validators}
+            )
 
         except Exception as err:
-            failed_urls.append(url)
+            # the copy downloaded previously is still valid
+            if previous is not None and os.path.isfile(
+                f"{download_folder}/{previous['name']}"
+            ):
+                downloaded_entries.append(previous)
+            else:
+                failed_urls.append(url)
+
             log.warning(
                 f"""
                 ERROR while downloading [Dataset index: {index}] [Dataset ID: {dataset_id}] url: {url}
@@ -141,7 +257,6 @@ def process_dataset(index: int, entry: dict, folder: str):
     tags = entry.get("tags", "")
 
     # serialize metadata and download information
-    data = dict()
     data["id"] = dataset_id
     data["title"] = clean_string(title)
     data["description"] = clean_string(description)
@@ -153,20 +268,14 @@ def process_dataset(index: int, entry: dict, folder: str):
     # prepare the JSON representation of the metadata
     content = json.dumps(data, ensure_ascii=False, indent=4)
 
-    # file in which the data will be stored
-    outfile = f"{download_folder}/metadata.json"
-
-    # check if data file already exists
-    data_file_already_exists = os.path.isfile(outfile)
-
-    if data_file_already_exists:
+    if data_file_already_exists and not refresh:
         log.warning(f"File {outfile} already exists")
 
     output_file = pathlib.Path(outfile)
     output_file.parent.mkdir(exist_ok=True, parents=True)
     output_file.write_text(content)
 
-    pass
+    return changed, failed_urls
 
 
 if __name__ == "__main__":
@@ -181,8 +290,35 @@ if __name__ == "__main__":
         type=int,
         help="Start downloading from the given index (included)",
     )
+    parser.add_argument(
+        "--shard",
+        type=str,
+        default=None,
+        help="Download only the shard i/N of the datasets (e.g. 0/4)",
+    )
+    parser.add_argument(
+        "--takeover",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="After the shard is completed download the shards abandoned by other nodes",
+    )
+    parser.add_argument(
+        "--refresh",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Download again only the files that changed since the previous download",
+    )
+    parser.add_argument(
+        "--changed-list",
+        type=str,
+        default=None,
+        help="File to which the IDs of the datasets with new or changed files are appended",
+    )
     args = parser.parse_args()
 
+    if args.shard is not None and args.start_from is not None:
+        parser.error("--start-from cannot be used together with --shard")
+
     # read JSON file provided as input
     f = open(args.file)
     data = json.load(f, strict=False)
@@ -199,8 +335,14 @@ if __name__ == "__main__":
     # Used as index for dataset iterations
     index = 0
 
+    # each shard logs to its own file, see `merge_shards.py`
+    log_file = "download.log"
+    if args.shard is not None:
+        log_file = f"{shard_name('download', *parse_shard(args.shard))}.log"
+
     logging.basicConfig(
-        filename="download.log",
+        level=logging.INFO,
+        filename=log_file,
         filemode="w",
         format="%(asctime)-15s %(levelname)-8s %(message)s",
     )
@@ -212,19 +354,53 @@ if __name__ == "__main__":
     if not os.path.isdir(download_folder):
         os.mkdir(download_folder)
 
-    for entry in datasets:
-        dataset_id = entry["dataset_id"]
+    def download(index: int, entry: dict) -> list:
+        changed, failed_urls = process_dataset(
+            index, entry, download_folder, args.refresh
+        )
+
+        # keep track of the datasets that have to be extracted again
+        if changed and args.changed_list is not None:
+            with open(args.changed_list, "a") as cl:
+                cl.write(f"{entry['dataset_id']}\n")
+
+        return failed_urls
+
+    def download_shard_item(dataset_id: str):
+        # raise so that the dataset is counted as failed in the summary of the shard
+        failed_urls = download(*entries[dataset_id])
+        if len(failed_urls) > 0:
+            raise RuntimeError(f"{len(failed_urls)} URLs cannot be downloaded")
+
+    if args.shard is not None:
+        # datasets are balanced by the number of URLs to download
+        entries = {str(e["dataset_id"]): (i, e) for i, e in enumerate(datasets)}
+        sizes = {d: len(e["download"]) for d, (_, e) in entries.items()}
+
+        for shard, items in assignments(
+            download_folder, "download", args.shard, sizes, args.takeover
+        ):
+            run_shard(
+                shard,
+                items,
+                download_shard_item,
+                log,
+            )
 
-        # Resume execution if needed
-        if resume_from is not None and index < resume_from:
-            print(f"Skipping dataset with ID {dataset_id} - [INDEX: {index}]")
-            index += 1
-            continue
+    else:
+        for entry in datasets:
+            dataset_id = entry["dataset_id"]
 
-        # process a dataset
-        print(
-            f"Processing dataset [ID: {dataset_id}] [INDEX: {index}] downloads: {len(entry['download'])}"
-        )
+            # Resume execution if needed
+            if resume_from is not None and index < resume_from:
+                print(f"Skipping dataset with ID {dataset_id} - [INDEX: {index}]")
+                index += 1
+                continue
 
-        process_dataset(index, entry, download_folder)
-        index += 1
+            # process a dataset
+            print(
+                f"Processing dataset [ID: {dataset_id}] [INDEX: {index}] downloads: {len(entry['download'])}"
+            )
+
+            download(index, entry)
+            index += 1
@@ -8,13 +8,17 @@ import json
 import logging
 import pathlib
 import argparse
-from rdflib import Graph
 from slugify import slugify
 from datetime import datetime
 from functools import partial
 from rich.progress import Progress
 from multiprocessing import Pool, cpu_count
-from rdflib.extras.external_graph_libs import rdflib_to_networkx_graph
+from sketches import SpaceSaving
+from schema import SchemaSummary, merge_dataset, write
+from preflight import PreflightCache
+from typing import Iterator
+from writers import BatchedWriter, output_name
+from sharding import assignments, dataset_size, parse_shard, run_shard, shard_name
 
 RDF_SUFFIXES = ["rdf", "ttl", "owl", "n3", "nt", "jsonld", "nq", "trig", "trix"]
 
@@ -26,7 +30,7 @@ def clean_string(s: str) -> str:
     return " ".join(s.split()).encode("unicode_escape").decode("unicode_escape")
 
 
-def get_literals(graph) -> list:
+def get_literals(graph) -> Iterator[str]:
     q = """
     SELECT ?literal { 
         ?s ?p ?literal 
@@ -35,16 +39,12 @@ def get_literals(graph) -> list:
     """
     match = graph.query(q)
 
-    literals = list()
-
     for item in match:
         label = clean_string(str(item[0]))
-        literals.append(label)
-
-    return literals
+        yield label
 
 
-def get_classes(graph) -> list:
+def get_classes(graph) -> Iterator[str]:
     q = """
     SELECT ?class
     WHERE {
@@ -53,16 +53,12 @@ def get_classes(graph) -> list:
     """
     match = graph.query(q)
 
-    classes = list()
-
     for item in match:
         label = clean_string(str(item[0]))
-        classes.append(label)
+        yield label
 
-    return classes
 
-
-def get_entities(graph) -> list:
+def get_entities(graph) -> Iterator[str]:
     q = """
     SELECT ?s
     WHERE {
@@ -71,16 +67,12 @@ def get_entities(graph) -> list:
     """
     match = graph.query(q)
 
-    entities = list()
-
     for item in match:
         name = clean_string(str(item[0]))
-        entities.append(name)
-
-    return entities
+        yield name
 
 
-def get_properties(graph) -> list:
+def get_properties(graph) -> Iterator[str]:
     q = """
     SELECT ?p
     WHERE {
@@ -89,13 +81,9 @@ def get_properties(graph) -> list:
     """
     match = graph.query(q)
 
-    properties = list()
-
     for item in match:
         label = clean_string(str(item[0]))
-        properties.append(label)
-
-    return properties
+        yield label
 
 
 def get_number_of_connections(graph) -> int:
@@ -163,10 +151,30 @@ def get_average_of_literals_per_vertex(graph) -> float:
     return round(avg, 3)
 
 
+def get_schema_summary(graph) -> dict:
+    from rdflib import RDF, Literal
+
+    summary = SchemaSummary()
+
+    # types first, properties are counted for the classes their subject has
+    for s, _, o in graph.triples((None, RDF.type, None)):
+        summary.add_type(clean_string(str(s)), clean_string(str(o)))
+
+    for s, p, o in graph:
+        if p != RDF.type:
+            summary.add_property(
+                clean_string(str(s)), clean_string(str(p)), isinstance(o, Literal)
+            )
+
+    return summary.to_dict()
+
+
 # processing functions
 
 
-def extract_data_from_file(dataset_folder: str, dataset: str, file: str) -> dict:
+def extract_data_from_file(
+    dataset_folder: str, dataset: str, file: str, compress: bool = False
+) -> dict:
     base_dataset_path = f"{dataset_folder}/{dataset}"
     file_path = f"{base_dataset_path}/{file}"
 
@@ -182,6 +190,9 @@ def extract_data_from_file(dataset_folder: str, dataset: str, file: str) -> dict
     if file_extension is None:
         raise ValueError(f"File {file_path} does not match any of allowed extensions")
 
+    # RDFLib is imported only when needed since it is expensive to load
+    from rdflib import Graph
+
     # load data into graph
     graph = Graph()
     graph.parse(file_path)
@@ -189,29 +200,48 @@ def extract_data_from_file(dataset_folder: str, dataset: str, file: str) -> dict
     # create output file names
     base_name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{slugify(file)}"
 
-    # write entities to file
-    entities_file = f"{base_name}-entities.txt"
-    with open(f"{base_dataset_path}/{entities_file}", "w+") as e_out:
+    # summaries of the most frequent terms
+    classes_sketch = SpaceSaving()
+    properties_sketch = SpaceSaving()
+    subjects_sketch = SpaceSaving()
+
+    # output files are written by dedicated threads while the graph is queried
+    entities_file = output_name(f"{base_name}-entities.txt", compress)
+    properties_file = output_name(f"{base_name}-properties.txt", compress)
+    literals_file = output_name(f"{base_name}-literals.txt", compress)
+    classes_file = output_name(f"{base_name}-classes.txt", compress)
+
+    with (
+        BatchedWriter(f"{base_dataset_path}/{entities_file}", compress) as e_out,
+        BatchedWriter(f"{base_dataset_path}/{properties_file}", compress) as p_out,
+        BatchedWriter(f"{base_dataset_path}/{literals_file}", compress) as l_out,
+        BatchedWriter(f"{base_dataset_path}/{classes_file}", compress) as c_out,
+    ):
+        # write entities to file
         for e in get_entities(graph):
-            e_out.write(f"{e}\n")
+            e_out.write(e)
 
-    # write properties to file
-    properties_file = f"{base_name}-properties.txt"
-    with open(f"{base_dataset_path}/{properties_file}", "w+") as p_out:
+        # subjects are counted once per triple, as done by `extract_stream.py`
+        for s in graph.subjects():
+            subjects_sketch.add(clean_string(str(s)))
+
+        # write properties to file
         for p in get_properties(graph):
-            p_out.write(f"{p}\n")
+            p_out.write(p)
+            properties_sketch.add(p)
 
-    # write literals to file
-    literals_file = f"{base_name}-literals.txt"
-    with open(f"{base_dataset_path}/{literals_file}", "w+") as l_out:
+        # write literals to file
         for l in get_literals(graph):
-            l_out.write(f"{l}\n")
+            l_out.write(l)
 
-    # write classes to file
-    classes_file = f"{base_name}-classes.txt"
-    with open(f"{base_dataset_path}/{classes_file}", "w+") as c_out:
+        # write classes to file
         for c in get_classes(graph):
-            c_out.write(f"{c}\n")
+            c_out.write(c)
+            classes_sketch.add(c)
+
+    # write the schema summary to file
+    schema_file = f"{base_name}-schema.json"
+    write(get_schema_summary(graph), f"{base_dataset_path}/{schema_file}")
 
     # create representation for the parsed dataset
     entry = {
@@ -221,9 +251,13 @@ def extract_data_from_file(dataset_folder: str, dataset: str, file: str) -> dict
         "literalsFile": literals_file,
         "entitiesFile": entities_file,
         "propertiesFile": properties_file,
+        "schemaFile": schema_file,
         "connections": get_number_of_connections(graph),
         "connectedVertices": get_number_of_connected_vertices(graph),
         "averageLiteralsPerVertex": get_average_of_literals_per_vertex(graph),
+        "topClasses": classes_sketch.to_dict(),
+        "topProperties": properties_sketch.to_dict(),
+        "topSubjects": subjects_sketch.to_dict(),
         "extractedWith": "RDFLib",
     }
 
@@ -234,7 +268,11 @@ def process_dataset(
     with_size_limit: bool,
     datasets_folder: str,
     dataset: str,
-):
+    compress: bool = False,
+) -> bool:
+    """Extracts data from the files of the dataset,
+    returns False if the dataset cannot be processed or one of its files cannot be parsed
+    """
     global log
 
     # path of where dataset files are stored
@@ -243,7 +281,7 @@ def process_dataset(
     # check that the given path is a folder
     if not os.path.isdir(dataset_folder):
         log.error(f"Path {dataset_folder} is not a folder")
-        return
+        return False
 
     # check if metadata file exists
     metadata_file = f"{dataset_folder}/metadata.json"
@@ -251,7 +289,7 @@ def process_dataset(
     data_file_exists = os.path.isfile(metadata_file)
     if not data_file_exists:
         log.error(f"File {metadata_file} does not exists")
-        return
+        return False
 
     # read metadata.json object from file
     with open(metadata_file, "r+") as f:
@@ -259,7 +297,13 @@ def process_dataset(
 
         # delete file created by previous processing
         if "extracted" in metadata.keys():
-            keys = ["classesFile", "literalsFile", "entitiesFile", "propertiesFile"]
+            keys = [
+                "classesFile",
+                "literalsFile",
+                "entitiesFile",
+                "propertiesFile",
+                "schemaFile",
+            ]
             for item in metadata["extracted"]:
                 for k in keys:
                     if k in item.keys():
@@ -267,12 +311,23 @@ def process_dataset(
                         if os.path.exists(ftdp):
                             os.remove(ftdp)
 
+        # delete the schema summary of the dataset
+        if "schemaFile" in metadata.keys():
+            ftdp = f"{dataset_folder}/{metadata['schemaFile']}"
+            if os.path.exists(ftdp):
+                os.remove(ftdp)
 
         # get a list of all the files inside the directory
         files_in_directory = os.listdir(dataset_folder)
 
         files_in_directory.remove("metadata.json")
 
+        # hidden files (e.g. the pre-flight cache) are not part of the dataset
+        files_in_directory = [f for f in files_in_directory if not f.startswith(".")]
+
+        # cheap checks that discard files that clearly cannot be parsed
+        preflight = PreflightCache(dataset_folder)
+
         usable_files = list()  # files that potentially can be used
         unused_files = list()  # files not used (format or parsing issues)
 
@@ -289,6 +344,13 @@ def process_dataset(
                 log.warning(f"{dataset_folder}/{file} does not have a valid extension")
                 continue
 
+            # check that the file looks parsable before loading it
+            reason = preflight.check(file)
+            if reason is not None:
+                unused_files.append({"file": file, "size": file_size, "reason": reason})
+                log.warning(f"{dataset_folder}/{file} failed pre-flight check: {reason}")
+                continue
+
             # if the file size is greater then the file limit then skip it
             if with_size_limit and file_size > SIZE_LIMIT:
                 unused_files.append({"file": file, "size": file_size})
@@ -298,8 +360,11 @@ def process_dataset(
             # if the file survived all the filtering above then mark it as usable
             usable_files.append(file)
 
+        preflight.save()
+
         # start extracting from the files inside the folder
         extracted = list()
+        failed = False
 
         # extract data from the files inside the directory of the dataset
         for file in usable_files:
@@ -308,12 +373,15 @@ def process_dataset(
 
             try:
                 # represent the data extracted from this file
-                representation = extract_data_from_file(datasets_folder, dataset, file)
+                representation = extract_data_from_file(
+                    datasets_folder, dataset, file, compress
+                )
                 extracted.append(representation)
 
             except Exception as e:
                 unused_files.append({"file": file, "size": file_size})
                 log.error(f"Exception occurred while processing {file_path}: {str(e)}")
+                failed = True
 
             finally:
                 continue
@@ -321,6 +389,7 @@ def process_dataset(
         # save extracted data
         metadata["extracted"] = extracted
         metadata["unusedFiles"] = unused_files
+        metadata["schemaFile"] = merge_dataset(dataset_folder, extracted)
 
         # print out a JSON file containing all the data
         content = json.dumps(metadata, ensure_ascii=False, indent=4)
@@ -332,6 +401,19 @@ def process_dataset(
 
         log.info(f"Processed {dataset_folder}")
 
+    return not failed
+
+
+def process_shard_item(
+    with_size_limit: bool,
+    datasets_folder: str,
+    dataset: str,
+    compress: bool = False,
+):
+    """Processes a dataset of a shard, raises if it fails so that it is counted in the summary of the shard"""
+    if not process_dataset(with_size_limit, datasets_folder, dataset, compress):
+        raise RuntimeError(f"Dataset {dataset} has not been processed completely")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -342,14 +424,43 @@ if __name__ == "__main__":
         action=argparse.BooleanOptionalAction,
         help="Enables the processing of files which size is more than 200MB",
     )
+    parser.add_argument(
+        "--compress",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Compress the extracted files with gzip",
+    )
+    parser.add_argument(
+        "--shard",
+        type=str,
+        default=None,
+        help="Process only the shard i/N of the datasets (e.g. 0/4)",
+    )
+    parser.add_argument(
+        "--takeover",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="After the shard is completed process the shards abandoned by other nodes",
+    )
+    parser.add_argument(
+        "--datasets-from",
+        type=str,
+        default=None,
+        help="Process only the datasets listed (one ID per line) in the given file",
+    )
 
     args = parser.parse_args()
     datasets_folder = args.folder
     without_size_limit = args.without_size_limit == True
 
+    # each shard logs to its own file, see `merge_shards.py`
+    log_file = "extract.log"
+    if args.shard is not None:
+        log_file = f"{shard_name('extract', *parse_shard(args.shard))}.log"
+
     logging.basicConfig(
         level=logging.INFO,
-        filename="extract.log",
+        filename=log_file,
         filemode="w",
         format="%(asctime)-15s %(levelname)-8s %(message)s",
     )
@@ -359,18 +470,52 @@ if __name__ == "__main__":
     if not without_size_limit:
         print(f"Size limit set to {SIZE_LIMIT} byte")
 
-    datasets = sorted(os.listdir(datasets_folder))
+    # hidden folders (e.g. `.shards`) are not datasets
+    datasets = sorted(d for d in os.listdir(datasets_folder) if not d.startswith("."))
+
+    # e.g. the list of datasets changed by `downloader.py --refresh`
+    if args.datasets_from is not None:
+        with open(args.datasets_from, "r") as df:
+            selected = set(line.strip() for line in df if len(line.strip()) > 0)
+        datasets = [d for d in datasets if d in selected]
 
     # parametrize the function call that is going to be executed in the pool
     parametrized_function_call = partial(
-        process_dataset, not without_size_limit, datasets_folder
+        process_dataset,
+        not without_size_limit,
+        datasets_folder,
+        compress=args.compress,
     )
 
     # create the pool and assign jobs to the pool
     pool_size = cpu_count() - 1
 
     with Pool(pool_size) as p, Progress(expand=True) as progress:
-        task = progress.add_task("[green]Processing...", total=len(datasets))
-
-        for _ in p.imap_unordered(parametrized_function_call, datasets):
-            progress.update(task, advance=1)
+        if args.shard is None:
+            task = progress.add_task("[green]Processing...", total=len(datasets))
+
+            for _ in p.imap_unordered(parametrized_function_call, datasets):
+                progress.update(task, advance=1)
+
+        else:
+            sizes = {d: dataset_size(f"{datasets_folder}/{d}") for d in datasets}
+
+            for shard, items in assignments(
+                datasets_folder, "extract", args.shard, sizes, args.takeover
+            ):
+                task = progress.add_task(f"[green]{shard.name}", total=len(items))
+                progress.update(task, completed=len(items) - len(shard.pending(items)))
+
+                run_shard(
+                    shard,
+                    items,
+                    partial(
+                        process_shard_item,
+                        not without_size_limit,
+                        datasets_folder,
+                        compress=args.compress,
+                    ),
+                    log,
+                    pool=p,
+                    on_item=lambda _: progress.update(task, advance=1),
+                )
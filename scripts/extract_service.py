@@ -0,0 +1,330 @@
+"""
+Runs the extraction as a long-running service with a pool of pre-warmed workers.
+
+Jobs are JSON objects that identify either a whole dataset or a single file of a dataset:
+    {"dataset": "32276"}                 extracted with RDFLib as done by `extract.py`
+    {"file": "32276/rqp4-39eg.rdf"}      extracted as a stream as done by `extract_stream.py`
+
+Jobs can be submitted in two ways:
+1) writing a `.json` file in the `incoming` folder of the spool directory, the result is written in its `done` folder
+2) sending one job per line to the local UNIX socket, a result per line is sent back as soon as each job completes
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+import socketserver
+from collections import deque
+from multiprocessing import Pool, cpu_count
+
+# Seconds between two scans of the spool directory
+POLL_INTERVAL = 1
+
+
+def init_worker(engines: list, with_size_limit: bool, datasets_folder: str):
+    """Loads in each worker the libraries used by the requested engines, before any job is received"""
+    global settings
+
+    settings = {"with_size_limit": with_size_limit, "datasets_folder": datasets_folder}
+
+    import extract
+    import extract_stream
+
+    # both modules log through a global logger created when run as scripts
+    extract.log = logging.getLogger()
+    extract_stream.log = logging.getLogger()
+
+    if "rdflib" in engines:
+        from rdflib import Graph
+
+        # parsing an empty document loads the parser plugins
+        Graph().parse(data="", format="turtle")
+
+    if "lightrdf" in engines:
+        import lightrdf
+
+
+def run_job(job: dict) -> dict:
+    import extract
+    import extract_stream
+
+    datasets_folder = settings["datasets_folder"]
+    start = time.time()
+
+    result = {"job": job}
+
+    try:
+        if "dataset" in job.keys():
+            dataset = str(job["dataset"])
+            processed = extract.process_dataset(
+                settings["with_size_limit"], datasets_folder, dataset
+            )
+            if not processed:
+                raise RuntimeError(
+                    f"Dataset {dataset} has not been processed completely, see the log"
+                )
+
+        elif "file" in job.keys():
+            dataset, file = job["file"].split("/", 1)
+            processed = extract_stream.process_file(datasets_folder, dataset, file)
+            if not processed:
+                raise RuntimeError(f"File {job['file']} cannot be parsed, see the log")
+
+        else:
+            raise ValueError("A job must contain either `dataset` or `file`")
+
+        # report what has been stored for the dataset
+        with open(f"{datasets_folder}/{dataset}/metadata.json", "r") as f:
+            metadata = json.load(f, strict=False)
+
+        result["status"] = "done"
+        result["extracted"] = [e["file"] for e in metadata.get("extracted", list())]
+        result["unusedFiles"] = [e["file"] for e in metadata.get("unusedFiles", list())]
+
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+
+    result["elapsed"] = round(time.time() - start, 3)
+
+    return result
+
+
+def job_dataset(job: dict):
+    if "dataset" in job.keys():
+        return str(job["dataset"])
+    if "file" in job.keys():
+        return str(job["file"]).split("/", 1)[0]
+    return None
+
+
+class Dispatcher:
+    """Submits jobs to the pool running at most one job at a time for each dataset,
+    since jobs of the same dataset rewrite the same `metadata.json`
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.lock = threading.Lock()
+
+        # dataset -> jobs waiting for the running one
+        self.queues = dict()
+
+    def submit(self, job: dict, callback):
+        # jobs without a dataset are not serialized
+        key = job_dataset(job) if isinstance(job, dict) else None
+        if key is None:
+            key = object()
+
+        with self.lock:
+            if key in self.queues:
+                self.queues[key].append((job, callback))
+                return
+            self.queues[key] = deque()
+
+        self._start(key, job, callback)
+
+    def _start(self, key, job: dict, callback):
+        # callbacks run in the result handler thread of the pool, if they raise the pool stops returning results
+        def done(result: dict):
+            try:
+                callback(result)
+            except Exception as e:
+                log.error(f"Cannot deliver the result of job {job}: {str(e)}")
+            finally:
+                self._next(key)
+
+        def failed(error: BaseException):
+            done({"job": job, "status": "error", "error": str(error)})
+
+        self.pool.apply_async(run_job, (job,), callback=done, error_callback=failed)
+
+    def _next(self, key):
+        with self.lock:
+            waiting = self.queues[key]
+            if len(waiting) == 0:
+                del self.queues[key]
+                return
+            job, callback = waiting.popleft()
+
+        self._start(key, job, callback)
+
+
+def watch_spool(dispatcher: Dispatcher, spool_folder: str):
+    global log
+
+    incoming = f"{spool_folder}/incoming"
+    running = f"{spool_folder}/running"
+    done = f"{spool_folder}/done"
+
+    for folder in [incoming, running, done]:
+        os.makedirs(folder, exist_ok=True)
+
+    def complete(name: str, result: dict):
+        # write the result first so that a job is never lost
+        with open(f"{done}/{name}.tmp", "w") as out:
+            out.write(json.dumps(result, ensure_ascii=False, indent=4))
+        os.replace(f"{done}/{name}.tmp", f"{done}/{name}")
+        os.remove(f"{running}/{name}")
+        log.info(f"Job {name} {result['status']} in {result.get('elapsed')}s")
+
+    # jobs left by a previous execution are submitted again
+    pending = sorted(os.listdir(running))
+
+    while True:
+        for name in sorted(os.listdir(incoming)):
+            if name.endswith(".json"):
+                os.replace(f"{incoming}/{name}", f"{running}/{name}")
+                pending.append(name)
+
+        for name in pending:
+            try:
+                with open(f"{running}/{name}", "r") as f:
+                    job = json.load(f)
+            except Exception as e:
+                log.error(f"Job {name} cannot be read: {str(e)}")
+                os.replace(f"{running}/{name}", f"{done}/{name}")
+                continue
+
+            dispatcher.submit(job, lambda r, n=name: complete(n, r))
+
+        pending = list()
+        time.sleep(POLL_INTERVAL)
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # callbacks run in the result handler thread of the pool, they only enqueue the results
+        # so that a client that does not read them cannot stop the delivery of the others
+        results = queue.Queue()
+
+        def read():
+            # number of results that the connection is going to receive
+            expected = 0
+
+            try:
+                for line in self.rfile:
+                    line = line.strip()
+                    if len(line) == 0:
+                        continue
+
+                    expected += 1
+
+                    try:
+                        job = json.loads(line)
+                    except Exception as e:
+                        results.put({"job": line.decode(), "status": "error", "error": str(e)})
+                        continue
+
+                    self.server.dispatcher.submit(job, results.put)
+
+            except OSError as e:
+                log.warning(f"Cannot read the jobs of a connection: {str(e)}")
+
+            finally:
+                # the number of results closes the queue
+                results.put(expected)
+
+        threading.Thread(target=read, daemon=True).start()
+
+        # keep the connection open until every job has been answered
+        answered = 0
+        expected = None
+        connected = True
+
+        while expected is None or answered < expected:
+            result = results.get()
+            if isinstance(result, int):
+                expected = result
+                continue
+
+            answered += 1
+
+            # results of a disconnected client are still drained
+            if not connected:
+                continue
+
+            try:
+                line = json.dumps(result, ensure_ascii=False) + "\n"
+                self.wfile.write(line.encode())
+                self.wfile.flush()
+            except OSError as e:
+                # e.g. the client disconnected before the answer
+                log.warning(f"Cannot send the result of job {result['job']}: {str(e)}")
+                connected = False
+
+
+class JobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", type=str, help="Folder in which datasets are stored")
+    parser.add_argument(
+        "--spool", type=str, default=None, help="Spool directory watched for jobs"
+    )
+    parser.add_argument(
+        "--socket", type=str, default=None, help="Path of the UNIX socket for jobs"
+    )
+    parser.add_argument(
+        "--engines",
+        type=str,
+        nargs="+",
+        default=["rdflib", "lightrdf"],
+        choices=["rdflib", "lightrdf"],
+        help="Libraries loaded by the workers at startup",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=cpu_count() - 1, help="Number of workers"
+    )
+    parser.add_argument(
+        "--without-size-limit",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Enables the processing of files which size is more than 200MB",
+    )
+    args = parser.parse_args()
+
+    if args.spool is None and args.socket is None:
+        parser.error("at least one among --spool and --socket is required")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        filename="extract_service.log",
+        filemode="a",
+        format="%(asctime)-15s %(levelname)-8s %(message)s",
+    )
+
+    log = logging.getLogger()
+
+    pool = Pool(
+        args.workers,
+        initializer=init_worker,
+        initargs=(args.engines, not args.without_size_limit, args.folder),
+    )
+    dispatcher = Dispatcher(pool)
+
+    if args.socket is not None:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+
+        server = JobServer(args.socket, JobHandler)
+        server.dispatcher = dispatcher
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Listening on {args.socket}")
+
+    try:
+        if args.spool is not None:
+            print(f"Watching {args.spool}")
+            watch_spool(dispatcher, args.spool)
+        else:
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.terminate()
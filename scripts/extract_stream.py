@@ -4,23 +4,34 @@ import queue
 import logging
 import pathlib
 import argparse
-import lightrdf
 from slugify import slugify
 from statistics import mean
 from datetime import datetime
 from collections import defaultdict
+from sketches import SpaceSaving
+from schema import SchemaSummary, merge_dataset, write
+from preflight import PreflightCache
+from writers import BatchedWriter, output_name
+from sharding import assignments, parse_shard, run_shard, shard_name
 
 RDF_SUFFIXES = ["rdf", "ttl", "owl", "n3", "nt", "jsonld", "nq", "trig", "trix"]
 
 SIZE_LIMIT = 200 * 1024 * 1024  # 200 MB
 
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+
 
 def clean_string(s: str) -> str:
     return " ".join(s.split()).encode("unicode_escape").decode("unicode_escape")
 
 
 def is_literal(node: str) -> bool:
-    return node.startswith('"') and node.endswith('"')
+    # typed and language-tagged literals end with their datatype or tag (e.g. `"5"^^<...>`, `"x"@en`)
+    return node.startswith('"')
+
+
+def literal_value(node: str) -> str:
+    return eval(node[: node.rfind('"') + 1])
 
 
 def process_triples(
@@ -29,40 +40,56 @@ def process_triples(
     properties_file: str,
     literals_file: str,
     classes_file: str,
+    schema_file: str,
+    compress: bool = False,
 ) -> dict:
     with (
-        open(entities_file, "w+") as e_out,
-        open(properties_file, "w+") as p_out,
-        open(literals_file, "w+") as l_out,
-        open(classes_file, "w+") as c_out,
+        BatchedWriter(entities_file, compress) as e_out,
+        BatchedWriter(properties_file, compress) as p_out,
+        BatchedWriter(literals_file, compress) as l_out,
+        BatchedWriter(classes_file, compress) as c_out,
     ):
+        import lightrdf
+
         doc = lightrdf.RDFDocument(file_path)
 
         number_of_connections = 0
         vertices_count_literals = defaultdict(int)
 
+        # summaries of the most frequent terms
+        classes_sketch = SpaceSaving()
+        properties_sketch = SpaceSaving()
+        subjects_sketch = SpaceSaving()
+
+        schema = SchemaSummary()
+
         for triple in doc.search_triples(None, None, None):
             sub = triple[0]
             prop = triple[1]
             obj = triple[2]
 
-            print(clean_string(sub), file=e_out)
+            e_out.write(clean_string(sub))
+            subjects_sketch.add(clean_string(sub))
 
-            if "type" in prop.lower() or "a" == prop.lower():
-                print(obj, file=c_out)
+            if prop == RDF_TYPE:
+                c_out.write(obj)
+                classes_sketch.add(obj)
+                schema.add_type(sub, obj)
                 continue
 
-            print(clean_string(prop), file=p_out)
+            p_out.write(clean_string(prop))
+            properties_sketch.add(clean_string(prop))
 
             is_obj_literal = is_literal(obj)
+            schema.add_property(sub, prop, is_obj_literal)
 
             if is_obj_literal:
-                obj_repr = clean_string(eval(obj))
+                obj_repr = clean_string(literal_value(obj))
                 if len(obj_repr) > 0:
-                    print(obj_repr, file=l_out)
+                    l_out.write(obj_repr)
 
             if not is_obj_literal:
-                print(clean_string(obj), file=e_out)
+                e_out.write(clean_string(obj))
                 number_of_connections += 1
 
             # count literals for each vertex
@@ -74,14 +101,22 @@ def process_triples(
         connected_vertices = len(vertices_count_literals.keys())
         average_literals_per_vertex = mean(vertices_count_literals.values())
 
+        write(schema.to_dict(), schema_file)
+
         return {
             "connections": number_of_connections,
             "connected_vertices": connected_vertices,
             "average_literals_per_vertex": average_literals_per_vertex,
+            "top_classes": classes_sketch.to_dict(),
+            "top_properties": properties_sketch.to_dict(),
+            "top_subjects": subjects_sketch.to_dict(),
         }
 
 
-def process_file(datasets_folder: str, dataset: str, file: str):
+def process_file(
+    datasets_folder: str, dataset: str, file: str, compress: bool = False
+) -> bool:
+    """Extracts data from the file as a stream, returns False if it cannot be parsed"""
     # file to be analyzed
     base_dataset_path = f"{datasets_folder}/{dataset}"
     file_path = f"{base_dataset_path}/{file}"
@@ -89,10 +124,11 @@ def process_file(datasets_folder: str, dataset: str, file: str):
 
     # create output file names
     base_name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{slugify(file)}"
-    entities_file = f"{base_name}-entities.txt"
-    properties_file = f"{base_name}-properties.txt"
-    literals_file = f"{base_name}-literals.txt"
-    classes_file = f"{base_name}-classes.txt"
+    entities_file = output_name(f"{base_name}-entities.txt", compress)
+    properties_file = output_name(f"{base_name}-properties.txt", compress)
+    literals_file = output_name(f"{base_name}-literals.txt", compress)
+    classes_file = output_name(f"{base_name}-classes.txt", compress)
+    schema_file = f"{base_name}-schema.json"
 
     data = None
 
@@ -103,16 +139,24 @@ def process_file(datasets_folder: str, dataset: str, file: str):
             f"{datasets_folder}/{dataset}/{properties_file}",
             f"{datasets_folder}/{dataset}/{literals_file}",
             f"{datasets_folder}/{dataset}/{classes_file}",
+            f"{datasets_folder}/{dataset}/{schema_file}",
+            compress,
         )
     except Exception as e:
         log.error(f"{file_path} cannot be parsed: {str(e)}")
 
         # If an error occurs delete all the associated files
-        for file in [entities_file, properties_file, literals_file, classes_file]:
-            if os.path.exists(file):
-                os.remove(file)
-
-        return
+        for f in [
+            entities_file,
+            properties_file,
+            literals_file,
+            classes_file,
+            schema_file,
+        ]:
+            if os.path.exists(f"{base_dataset_path}/{f}"):
+                os.remove(f"{base_dataset_path}/{f}")
+
+        return False
 
     log.info(f"{file_path} processed")
 
@@ -124,9 +168,13 @@ def process_file(datasets_folder: str, dataset: str, file: str):
         "literalsFile": literals_file,
         "entitiesFile": entities_file,
         "propertiesFile": properties_file,
+        "schemaFile": schema_file,
         "connections": data["connections"],
         "connectedVertices": data["connected_vertices"],
         "averageLiteralsPerVertex": data["average_literals_per_vertex"],
+        "topClasses": data["top_classes"],
+        "topProperties": data["top_properties"],
+        "topSubjects": data["top_subjects"],
         "extractedWith": "lightrdf",
     }
 
@@ -135,6 +183,7 @@ def process_file(datasets_folder: str, dataset: str, file: str):
 
         data["unusedFiles"] = [e for e in data["unusedFiles"] if e["file"] != file]
         data["extracted"].append(entry)
+        data["schemaFile"] = merge_dataset(base_dataset_path, data["extracted"])
 
         new_content = json.dumps(data, ensure_ascii=False, indent=4)
 
@@ -142,17 +191,48 @@ def process_file(datasets_folder: str, dataset: str, file: str):
         mf.truncate(0)
         mf.write(new_content)
 
+    return True
+
+
+def process_shard_item(datasets_folder: str, item: str, compress: bool = False):
+    """Processes a file (`dataset/file`) of a shard, raises if it fails so that it is counted in the summary of the shard"""
+    if not process_file(datasets_folder, *item.split("/", 1), compress):
+        raise RuntimeError(f"File {item} cannot be parsed")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("folder", type=str, help="Folder in which datasets are stored")
+    parser.add_argument(
+        "--compress",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Compress the extracted files with gzip",
+    )
+    parser.add_argument(
+        "--shard",
+        type=str,
+        default=None,
+        help="Process only the shard i/N of the files (e.g. 0/4)",
+    )
+    parser.add_argument(
+        "--takeover",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="After the shard is completed process the shards abandoned by other nodes",
+    )
     args = parser.parse_args()
 
     datasets_folder = args.folder
 
+    # each shard logs to its own file, see `merge_shards.py`
+    log_file = "extract_stream.log"
+    if args.shard is not None:
+        log_file = f"{shard_name('extract_stream', *parse_shard(args.shard))}.log"
+
     logging.basicConfig(
         level=logging.INFO,
-        filename="extract_stream.log",
+        filename=log_file,
         filemode="w",
         format="%(asctime)-15s %(levelname)-8s %(message)s",
     )
@@ -164,11 +244,18 @@ if __name__ == "__main__":
 
     # Fill the queue with files to process
     for dataset in os.listdir(datasets_folder):
+        # hidden folders (e.g. `.shards`) are not datasets
+        if dataset.startswith("."):
+            continue
+
         metadata_file_path = f"{datasets_folder}/{dataset}/metadata.json"
 
         with open(metadata_file_path, "r") as f:
             metadata = json.load(f, strict=False)
 
+            # cheap checks that discard files that clearly cannot be parsed
+            preflight = PreflightCache(f"{datasets_folder}/{dataset}")
+
             keys = metadata.keys()
             if "unusedFiles" in keys and len(metadata["unusedFiles"]) > 0:
                 for entry in metadata["unusedFiles"]:
@@ -189,10 +276,36 @@ if __name__ == "__main__":
                             f"{file_path} extension does not match allowed values"
                         )
 
-                    if file_extension is not None and file_size > SIZE_LIMIT:
-                        files_to_process.put((dataset, file))
-
-    # Process the jobs from the queue sequentially
-    while not files_to_process.empty():
-        dataset, file = files_to_process.get()
-        process_file(datasets_folder, dataset, file)
+                    if file_extension is None or file_size <= SIZE_LIMIT:
+                        continue
+
+                    reason = preflight.check(file)
+                    if reason is not None:
+                        log.warning(f"{file_path} failed pre-flight check: {reason}")
+                        continue
+
+                    files_to_process.put((dataset, file, file_size))
+
+            preflight.save()
+
+    if args.shard is None:
+        # Process the jobs from the queue sequentially
+        while not files_to_process.empty():
+            dataset, file, _ = files_to_process.get()
+            process_file(datasets_folder, dataset, file, args.compress)
+
+    else:
+        sizes = dict()
+        while not files_to_process.empty():
+            dataset, file, file_size = files_to_process.get()
+            sizes[f"{dataset}/{file}"] = file_size
+
+        for shard, items in assignments(
+            datasets_folder, "extract_stream", args.shard, sizes, args.takeover
+        ):
+            run_shard(
+                shard,
+                items,
+                lambda item: process_shard_item(datasets_folder, item, args.compress),
+                log,
+            )
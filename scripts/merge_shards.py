@@ -0,0 +1,100 @@
+"""
+Combines the results of a run split in shards (see `--shard` in `downloader.py`, `extract.py` and `extract_stream.py`).
+
+It merges the logs written by each shard (`<stage>-shard-i-of-N.log`) in a single log ordered by time,
+and the summaries of the shards in a single summary of the whole collection.
+"""
+
+import os
+import re
+import json
+import glob
+import argparse
+from sharding import SHARDS_FOLDER, shard_name
+
+STAGES = ["download", "extract", "extract_stream"]
+
+# Log records start with the timestamp, lines that do not are the continuation of a record
+RECORD_START = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} ")
+
+
+def read_records(log_file: str) -> list:
+    records = list()
+
+    with open(log_file, "r") as f:
+        for line in f:
+            if RECORD_START.match(line) or len(records) == 0:
+                records.append(line)
+            else:
+                records[-1] += line
+
+    return records
+
+
+def merge_logs(log_files: list, output_file: str):
+    records = list()
+    for log_file in log_files:
+        records.extend(read_records(log_file))
+
+    # timestamps have a fixed width, so they can be sorted as strings
+    records.sort(key=lambda r: r[:23])
+
+    with open(output_file, "w") as out:
+        out.writelines(records)
+
+
+def merge_summaries(folder: str, stage: str, total: int) -> dict:
+    merged = {
+        "stage": stage,
+        "shards": total,
+        "items": 0,
+        "processed": 0,
+        "failed": 0,
+        "elapsed": 0,
+        "missingShards": list(),
+    }
+
+    for index in range(total):
+        summary_file = f"{folder}/{SHARDS_FOLDER}/{shard_name(stage, index, total)}.json"
+
+        if not os.path.isfile(summary_file):
+            merged["missingShards"].append(index)
+            continue
+
+        with open(summary_file, "r") as f:
+            summary = json.load(f)
+
+        for k in ["items", "processed", "failed"]:
+            merged[k] += summary[k]
+
+        # shards run in parallel, the run lasts as much as the slowest one
+        merged["elapsed"] = max(merged["elapsed"], summary["elapsed"])
+
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "folder", type=str, help="Folder in which datasets are stored (or downloaded)"
+    )
+    parser.add_argument("stage", type=str, choices=STAGES, help="Stage to merge")
+    parser.add_argument("shards", type=int, help="Number of shards of the run")
+    parser.add_argument(
+        "--logs",
+        type=str,
+        default=".",
+        help="Folder that contains the logs of the shards",
+    )
+    args = parser.parse_args()
+
+    log_files = sorted(glob.glob(f"{args.logs}/{args.stage}-shard-*-of-{args.shards}.log"))
+    merge_logs(log_files, f"{args.stage}.log")
+
+    summary = merge_summaries(args.folder, args.stage, args.shards)
+    summary["logs"] = log_files
+
+    with open(f"{args.stage}-summary.json", "w") as out:
+        out.write(json.dumps(summary, indent=4))
+
+    print(json.dumps(summary, indent=4))
@@ -0,0 +1,228 @@
+"""
+Cheap checks run before a file is parsed, to discard files that clearly cannot be parsed
+(e.g. HTML error pages saved as `.rdf`, archives, truncated downloads) without reading them entirely.
+
+Only a bounded prefix of the file is parsed, using the format declared by its extension, and its tail is checked for truncation.
+Verdicts are cached in each dataset folder, keyed by a fingerprint of the file.
+"""
+
+import os
+import re
+import json
+import hashlib
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+RDF_SUFFIXES = ["rdf", "ttl", "owl", "n3", "nt", "jsonld", "nq", "trig", "trix"]
+
+# Bytes read from the beginning and the end of each file
+HEAD_SIZE = 64 * 1024  # 64 KB
+TAIL_SIZE = 4 * 1024  # 4 KB
+
+CACHE_FILE = ".preflight.json"
+
+# Changes when the checks change, verdicts of older caches are ignored
+CACHE_VERSION = 3
+
+# Loose N-Triples / N-Quads statement: subject, predicate, object (and graph) followed by a dot
+NT_STATEMENT = re.compile(r"^\s*(<[^>]*>|_:\S+)\s+<[^>]*>\s+.+\.\s*(#.*)?$")
+
+# Last statement of a file, possibly followed by a comment (`#` may also appear inside IRIs and literals)
+NT_END = re.compile(r"\.\s*(#.*)?$")
+TURTLE_END = re.compile(r"[.}]\s*(#.*)?$")
+
+# XML declaration and comments that may precede the root element of an HTML page
+PROLOG = re.compile(r"^(<\?xml.*?\?>\s*|<!--.*?-->\s*)*", re.DOTALL)
+
+HTML_MARKERS = ["<!doctype html", "<html", "<head", "<body"]
+
+# Byte order marks and beginnings of an XML declaration (`<?`) of text that is not UTF-8, longest first
+ENCODINGS = [
+    (b"\xff\xfe\x00\x00", "utf-32-le"),
+    (b"\x00\x00\xfe\xff", "utf-32-be"),
+    (b"<\x00\x00\x00", "utf-32-le"),
+    (b"\x00\x00\x00<", "utf-32-be"),
+    (b"\xff\xfe", "utf-16-le"),
+    (b"\xfe\xff", "utf-16-be"),
+    (b"<\x00?\x00", "utf-16-le"),
+    (b"\x00<\x00?", "utf-16-be"),
+]
+
+
+def declared_format(file: str) -> str:
+    file_suffix = file.split(".")[-1].lower()
+
+    file_extension = None
+    for ext in RDF_SUFFIXES:
+        if ext in file_suffix:
+            file_extension = ext
+
+    return file_extension
+
+
+def read_ends(file_path: str) -> tuple:
+    size = os.path.getsize(file_path)
+
+    with open(file_path, "rb") as f:
+        head = f.read(HEAD_SIZE)
+
+        tail = b""
+        if size > HEAD_SIZE:
+            f.seek(max(size - TAIL_SIZE, HEAD_SIZE))
+            tail = f.read()
+
+    return size, head, tail
+
+
+def fingerprint(size: int, head: bytes, tail: bytes) -> str:
+    return hashlib.sha1(str(size).encode() + head + tail).hexdigest()
+
+
+def text_encoding(head: bytes) -> str:
+    for start, encoding in ENCODINGS:
+        if head.startswith(start):
+            return encoding
+    return "utf-8"
+
+
+def strip_comments(lines: list) -> list:
+    return [l for l in lines if len(l.strip()) > 0 and not l.strip().startswith("#")]
+
+
+def check_xml(head: str, end: str, size: int) -> str:
+    parser = XMLPullParser()
+    try:
+        # a prefix is not a complete document, errors are only reported for malformed content
+        parser.feed(head)
+        for _ in parser.read_events():
+            pass
+    except ParseError as e:
+        return f"malformed XML: {str(e)}"
+
+    if not end.endswith(">"):
+        return "truncated XML"
+
+    root = re.search(r"<([\w.-]+:)?(RDF|TriX)[\s>]", head)
+    if root is not None and size > HEAD_SIZE:
+        closing = re.compile(rf"</([\w.-]+:)?{root.group(2)}\s*>\s*$")
+        if closing.search(end) is None:
+            return f"missing closing tag of {root.group(2)}"
+
+    return None
+
+
+def check_ntriples(head: str, end: str, size: int) -> str:
+    lines = head.split("\n")
+
+    # the last line of the prefix may be cut
+    if size > HEAD_SIZE:
+        lines = lines[:-1]
+
+    for line in strip_comments(lines):
+        if NT_STATEMENT.match(line) is None:
+            return f"not a valid statement: {line.strip()[:80]}"
+
+    last = strip_comments(end.split("\n"))
+    if len(last) > 0 and NT_END.search(last[-1].strip()) is None:
+        return "truncated statement at the end of the file"
+
+    return None
+
+
+def check_turtle(head: str, end: str, size: int) -> str:
+    if head.startswith("<?xml") or head.startswith("{") or head.startswith("["):
+        return "content does not match the declared format"
+
+    last = strip_comments(end.split("\n"))
+    if len(last) > 0 and TURTLE_END.search(last[-1].strip()) is None:
+        return "truncated statement at the end of the file"
+
+    return None
+
+
+def check_jsonld(head: str, end: str, size: int) -> str:
+    if not head.startswith(("{", "[")):
+        return "content does not start as JSON"
+
+    if not end.endswith(("}", "]")):
+        return "truncated JSON"
+
+    return None
+
+
+CHECKS = {
+    "rdf": check_xml,
+    "owl": check_xml,
+    "trix": check_xml,
+    "nt": check_ntriples,
+    "nq": check_ntriples,
+    "ttl": check_turtle,
+    "n3": check_turtle,
+    "trig": check_turtle,
+    "jsonld": check_jsonld,
+}
+
+
+def check(size: int, head: bytes, tail: bytes, file_format: str) -> str:
+    """Returns the reason why the file cannot be parsed, None if it looks parsable"""
+    if size == 0:
+        return "empty file"
+
+    if head.startswith(b"\x1f\x8b") or head.startswith(b"PK\x03\x04"):
+        return "compressed archive"
+
+    # UTF-16 and UTF-32 text contains NUL bytes
+    encoding = text_encoding(head)
+    if encoding == "utf-8" and b"\x00" in head:
+        return "binary content"
+
+    # the prefix and the tail may cut a multi-byte character
+    text = head.decode(encoding, errors="ignore").lstrip("\ufeff").lstrip()
+    end = (tail if len(tail) > 0 else head).decode(encoding, errors="ignore").rstrip()
+
+    # only the beginning of the document is checked, literals may contain HTML
+    start = PROLOG.sub("", text[:1024], count=1).lower()
+    if start.startswith(tuple(HTML_MARKERS)):
+        return "HTML page"
+
+    return CHECKS[file_format](text, end, size)
+
+
+class PreflightCache:
+    def __init__(self, dataset_folder: str):
+        self.dataset_folder = dataset_folder
+        self.cache_file = f"{dataset_folder}/{CACHE_FILE}"
+        self.changed = False
+
+        self.verdicts = dict()
+        if os.path.isfile(self.cache_file):
+            try:
+                with open(self.cache_file, "r") as f:
+                    self.verdicts = json.load(f)
+
+                if self.verdicts.pop("version", None) != CACHE_VERSION:
+                    self.verdicts = dict()
+            except Exception:
+                self.verdicts = dict()
+
+    def check(self, file: str) -> str:
+        """Returns the reason why the file of the dataset cannot be parsed, None if it looks parsable"""
+        file_format = declared_format(file)
+        if file_format is None:
+            return "extension does not match allowed values"
+
+        size, head, tail = read_ends(f"{self.dataset_folder}/{file}")
+        key = f"{file_format}:{fingerprint(size, head, tail)}"
+
+        if key not in self.verdicts:
+            self.verdicts[key] = check(size, head, tail, file_format)
+            self.changed = True
+
+        return self.verdicts[key]
+
+    def save(self):
+        if self.changed:
+            # replace the file instead of rewriting it, it may be hardlinked in a test collection
+            with open(f"{self.cache_file}.tmp", "w") as f:
+                f.write(json.dumps({**self.verdicts, "version": CACHE_VERSION}, indent=4))
+            os.replace(f"{self.cache_file}.tmp", self.cache_file)
+            self.changed = False
@@ -0,0 +1,143 @@
+"""
+Schema summary of an RDF file, built while its triples are processed.
+
+For each class it reports the number of instances and, for each property used by the instances,
+how many times it is used and how many objects are literals or IRIs.
+Classes and properties are interned to integers and counts are kept for each (set of classes, property) pair,
+the only state kept for each subject is the identifier of its set of classes.
+A property is counted for the classes its subject has when the triple is read, so types should come first.
+"""
+
+import os
+import json
+from collections import Counter
+
+# Name of the file that stores the summary of a whole dataset
+DATASET_SCHEMA_FILE = "metadata.schema.json"
+
+# Class used for the subjects without a type
+UNTYPED = ""
+
+
+class SchemaSummary:
+    def __init__(self):
+        # classes and properties
+        self.ids = dict()
+        self.terms = list()
+
+        # sets of classes, the first one is the set of the subjects without a type
+        self.class_set_ids = {frozenset(): 0}
+        self.class_sets = [frozenset()]
+
+        # subject -> set of classes
+        self.subject_classes = dict()
+
+        # (set of classes, property) -> [literal objects, IRI objects]
+        self.property_counts = dict()
+
+    def intern(self, term: str) -> int:
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.ids[term] = term_id
+            self.terms.append(term)
+        return term_id
+
+    def intern_class_set(self, classes: frozenset) -> int:
+        class_set = self.class_set_ids.get(classes)
+        if class_set is None:
+            class_set = len(self.class_sets)
+            self.class_set_ids[classes] = class_set
+            self.class_sets.append(classes)
+        return class_set
+
+    def add_type(self, subject: str, cls: str):
+        classes = self.class_sets[self.subject_classes.get(subject, 0)]
+        self.subject_classes[subject] = self.intern_class_set(
+            classes | {self.intern(cls)}
+        )
+
+    def add_property(self, subject: str, prop: str, is_literal: bool):
+        class_set = self.subject_classes.setdefault(subject, 0)
+        counts = self.property_counts.setdefault((class_set, self.intern(prop)), [0, 0])
+        counts[0 if is_literal else 1] += 1
+
+    def to_dict(self) -> dict:
+        untyped = self.intern(UNTYPED)
+
+        def classes_of(class_set: int):
+            return self.class_sets[class_set] or {untyped}
+
+        # class -> [instances, {property -> [literal objects, IRI objects]}]
+        classes = dict()
+
+        for class_set, subjects in Counter(self.subject_classes.values()).items():
+            for cls in classes_of(class_set):
+                classes.setdefault(cls, [0, dict()])[0] += subjects
+
+        for (class_set, prop), (literals, iris) in self.property_counts.items():
+            for cls in classes_of(class_set):
+                summary = classes.setdefault(cls, [0, dict()])
+                counts = summary[1].setdefault(prop, [0, 0])
+                counts[0] += literals
+                counts[1] += iris
+
+        return {
+            self.terms[cls]: {
+                "instances": instances,
+                "properties": {
+                    self.terms[prop]: property_entry(literals, iris)
+                    for prop, (literals, iris) in properties.items()
+                },
+            }
+            for cls, (instances, properties) in classes.items()
+        }
+
+
+def property_entry(literals: int, iris: int) -> dict:
+    return {
+        "count": literals + iris,
+        "literals": literals,
+        "iris": iris,
+        "literalRatio": round(literals / (literals + iris), 3),
+    }
+
+
+def merge(summaries) -> dict:
+    """Merges schema summaries (as produced by `SchemaSummary.to_dict`)"""
+    merged = dict()
+
+    for summary in summaries:
+        for cls, entry in summary.items():
+            target = merged.setdefault(cls, {"instances": 0, "properties": dict()})
+            target["instances"] += entry["instances"]
+
+            for prop, counts in entry["properties"].items():
+                current = target["properties"].get(prop, {"literals": 0, "iris": 0})
+                target["properties"][prop] = property_entry(
+                    current["literals"] + counts["literals"],
+                    current["iris"] + counts["iris"],
+                )
+
+    return merged
+
+
+def write(summary: dict, file_path: str):
+    # replace the file instead of rewriting it, it may be hardlinked in a test collection
+    with open(f"{file_path}.tmp", "w") as out:
+        out.write(json.dumps(summary, ensure_ascii=False, indent=4))
+    os.replace(f"{file_path}.tmp", file_path)
+
+
+def merge_dataset(dataset_folder: str, extracted: list) -> str:
+    """Merges the summaries of the files extracted from a dataset, returns the name of the merged file"""
+    summaries = list()
+
+    for item in extracted:
+        if "schemaFile" in item.keys():
+            with open(f"{dataset_folder}/{item['schemaFile']}", "r") as f:
+                summaries.append(json.load(f))
+
+    write(merge(summaries), f"{dataset_folder}/{DATASET_SCHEMA_FILE}")
+
+    return DATASET_SCHEMA_FILE
@@ -0,0 +1,294 @@
+"""
+Splits the work of the scripts across several nodes that share the same filesystem.
+
+Items (datasets or URLs) are assigned to N shards deterministically, balancing the total size of each shard.
+A node working on a shard holds a lease file that it keeps refreshing, when a lease is not refreshed for a while
+its shard can be taken over by another node, that skips the items already marked as done.
+"""
+
+import os
+import json
+import time
+import zlib
+import socket
+import threading
+from functools import partial
+
+# Folder (inside the datasets folder) that stores leases, done markers and shard summaries
+SHARDS_FOLDER = ".shards"
+
+# Seconds after which a lease that has not been refreshed is considered abandoned
+LEASE_TIMEOUT = 15 * 60
+
+# Files written by the scripts inside dataset folders, not counted in the size of a dataset
+OUTPUT_SUFFIXES = (
+    "-entities.txt",
+    "-properties.txt",
+    "-literals.txt",
+    "-classes.txt",
+    "-schema.json",
+    ".txt.gz",
+    ".part",
+    "metadata.json",
+)
+
+
+def parse_shard(value: str) -> tuple:
+    """Parses a shard in the form `i/N` with 0 <= i < N"""
+    index, total = (int(v) for v in value.split("/"))
+
+    if total < 1 or index < 0 or index >= total:
+        raise ValueError(f"Invalid shard {value}")
+
+    return index, total
+
+
+def partition(sizes: dict, total: int) -> list:
+    """Assigns each item to a shard, the biggest items first to the shard with the lowest total size.
+    Ties are broken by name, so every node computes the same assignment.
+    """
+    shards = [list() for _ in range(total)]
+    loads = [0] * total
+
+    for item in sorted(sizes.keys(), key=lambda i: (-sizes[i], i)):
+        target = min(range(total), key=lambda s: (loads[s], s))
+        shards[target].append(item)
+        loads[target] += sizes[item]
+
+    return [sorted(s) for s in shards]
+
+
+def dataset_size(dataset_folder: str) -> int:
+    size = 0
+    with os.scandir(dataset_folder) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.endswith(OUTPUT_SUFFIXES):
+                size += entry.stat().st_size
+    return size
+
+
+def shard_name(stage: str, index: int, total: int) -> str:
+    return f"{stage}-shard-{index}-of-{total}"
+
+
+def shared_partition(folder: str, stage: str, sizes: dict, total: int) -> list:
+    """Returns the partition of the run, computed once by the first node and stored in the shards folder.
+    Every node (and every takeover) reads the stored partition, since the view of the collection
+    of each node changes while the run is in progress.
+    """
+    shards_folder = f"{folder}/{SHARDS_FOLDER}"
+    os.makedirs(shards_folder, exist_ok=True)
+
+    partition_file = f"{shards_folder}/{stage}-of-{total}.partition.json"
+
+    if not os.path.isfile(partition_file):
+        tmp_file = f"{partition_file}.{socket.gethostname()}.{os.getpid()}"
+        with open(tmp_file, "w") as f:
+            f.write(json.dumps(partition(sizes, total)))
+
+        # linking fails if another node stored its partition first, the file is never seen partially written
+        try:
+            os.link(tmp_file, partition_file)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_file)
+
+    with open(partition_file, "r") as f:
+        parts = json.load(f)
+
+    # items that appeared after the partition has been stored are assigned by their name
+    assigned = set(i for part in parts for i in part)
+    for item in sorted(sizes.keys()):
+        if item not in assigned:
+            parts[zlib.crc32(item.encode()) % total].append(item)
+
+    return parts
+
+
+class Shard:
+    def __init__(self, folder: str, stage: str, index: int, total: int):
+        self.stage = stage
+        self.index = index
+        self.total = total
+        self.name = shard_name(stage, index, total)
+        self.folder = f"{folder}/{SHARDS_FOLDER}"
+        self.lease_file = f"{self.folder}/{self.name}.lease"
+        self.done_folder = f"{self.folder}/{self.name}.done"
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        os.makedirs(self.done_folder, exist_ok=True)
+
+    def claim(self) -> bool:
+        """Acquires the lease of the shard, if it is not held by a live node"""
+        content = json.dumps({"owner": self.owner, "claimed": time.time()})
+
+        try:
+            fd = os.open(self.lease_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            return True
+        except FileExistsError:
+            pass
+
+        holder = self.holder()
+
+        # a node restarted on the same host takes back its own shard
+        if not self.is_stale() and not self.same_host(holder):
+            return holder == self.owner
+
+        # replace the abandoned lease, then check that no other node did the same
+        tmp_file = f"{self.lease_file}.{self.owner}"
+        with open(tmp_file, "w") as f:
+            f.write(content)
+        os.replace(tmp_file, self.lease_file)
+
+        time.sleep(1)
+        return self.holder() == self.owner
+
+    def same_host(self, owner: str) -> bool:
+        return owner is not None and owner.split(":")[0] == self.owner.split(":")[0]
+
+    def holder(self) -> str:
+        try:
+            with open(self.lease_file, "r") as f:
+                return json.load(f)["owner"]
+        except Exception:
+            return None
+
+    def is_stale(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self.lease_file) > LEASE_TIMEOUT
+        except FileNotFoundError:
+            return True
+
+    def heartbeat(self):
+        """Refreshes the lease, to be called at least once every LEASE_TIMEOUT seconds"""
+        os.utime(self.lease_file)
+
+    def release(self):
+        if self.holder() == self.owner:
+            os.remove(self.lease_file)
+
+    def marker(self, item: str) -> str:
+        # items can be paths, e.g. `dataset/file`
+        return f"{self.done_folder}/{item.replace('/', '%2F')}"
+
+    def is_done(self, item: str) -> bool:
+        return os.path.exists(self.marker(item))
+
+    def mark_done(self, item: str):
+        open(self.marker(item), "w").close()
+
+    def pending(self, items: list) -> list:
+        return [i for i in items if not self.is_done(i)]
+
+    def write_summary(self, summary: dict):
+        summary_file = f"{self.folder}/{self.name}.json"
+
+        # a shard resumed (or taken over) keeps the counts of the previous runs
+        if os.path.isfile(summary_file):
+            with open(summary_file, "r") as f:
+                previous = json.load(f)
+            for k in ["processed", "failed", "elapsed"]:
+                summary[k] += previous[k]
+
+        summary = dict(summary, shard=self.name, owner=self.owner, finished=time.time())
+        with open(summary_file, "w") as f:
+            f.write(json.dumps(summary, indent=4))
+
+
+def abandoned_shards(folder: str, stage: str, total: int, skip: int) -> list:
+    """Shards whose lease has expired before all of their items have been processed"""
+    shards = list()
+
+    for index in range(total):
+        if index == skip:
+            continue
+
+        shard = Shard(folder, stage, index, total)
+        summary_exists = os.path.isfile(f"{shard.folder}/{shard.name}.json")
+
+        if not summary_exists and os.path.exists(shard.lease_file) and shard.is_stale():
+            shards.append(shard)
+
+    return shards
+
+
+def assignments(folder: str, stage: str, value: str, sizes: dict, takeover: bool):
+    """Yields the shards (with their items) this node has to process:
+    the shard given as `i/N` and, if `takeover` is set, the abandoned ones found after it has been completed.
+    """
+    index, total = parse_shard(value)
+    parts = shared_partition(folder, stage, sizes, total)
+
+    shard = Shard(folder, stage, index, total)
+    if not shard.claim():
+        raise RuntimeError(f"Shard {shard.name} is held by {shard.holder()}")
+
+    yield shard, parts[index]
+
+    if not takeover:
+        return
+
+    for other in abandoned_shards(folder, stage, total, index):
+        if other.claim():
+            yield other, parts[other.index]
+
+
+def call(process, item: str) -> tuple:
+    try:
+        process(item)
+        return item, None
+    except Exception as e:
+        return item, str(e)
+
+
+def run_shard(shard: Shard, items: list, process, log, pool=None, on_item=None) -> dict:
+    """Processes the items of the shard that are not done yet and records its summary.
+    `process` raises when an item fails, so that it is counted in the summary.
+    When a pool is given items are processed in parallel, `on_item` is called after each item.
+    """
+    start = time.time()
+    processed = 0
+    failed = 0
+
+    # keep the lease alive while the items are being processed
+    stop = threading.Event()
+
+    def keep_alive():
+        while not stop.wait(LEASE_TIMEOUT / 3):
+            shard.heartbeat()
+
+    threading.Thread(target=keep_alive, daemon=True).start()
+
+    pending = shard.pending(items)
+    task = partial(call, process)
+    results = map(task, pending) if pool is None else pool.imap_unordered(task, pending)
+
+    try:
+        for item, error in results:
+            if error is None:
+                processed += 1
+            else:
+                failed += 1
+                log.error(f"[{shard.name}] {item} failed: {error}")
+
+            # failed items are not processed again by a node that takes over
+            shard.mark_done(item)
+
+            if on_item is not None:
+                on_item(item)
+    finally:
+        stop.set()
+
+    summary = {
+        "items": len(items),
+        "processed": processed,
+        "failed": failed,
+        "elapsed": round(time.time() - start, 3),
+    }
+    shard.write_summary(summary)
+    shard.release()
+
+    return summary
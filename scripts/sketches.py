@@ -0,0 +1,118 @@
+"""
+Heavy-hitter summaries used to keep track of the most frequent terms while the triples are processed.
+
+The summaries are stored inside the `extracted` entries of `metadata.json` and can be merged
+across files and datasets without going back to the extracted text files.
+"""
+
+import heapq
+
+# Number of terms stored for each summary
+TOP_K = 100
+
+# Number of counters kept in memory while processing a file
+CAPACITY = 1000
+
+
+class SpaceSaving:
+    """Space-Saving summary of the most frequent items of a stream.
+
+    Counts are overestimated by at most the value reported in `errors`.
+    Counters are pruned in batches, when the number of tracked items reaches twice the capacity,
+    so that each update costs O(1) amortized.
+    """
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self.counts = dict()
+        self.errors = dict()
+
+        # largest count evicted so far, bound on the count of any untracked item
+        self.floor = 0
+
+    def add(self, item: str, count: int = 1):
+        if item in self.counts:
+            self.counts[item] += count
+            return
+
+        self.counts[item] = self.floor + count
+        self.errors[item] = self.floor
+
+        if len(self.counts) >= 2 * self.capacity:
+            self._prune()
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def merge(self, other: "SpaceSaving"):
+        # items missing from one of the two summaries may have been seen up to its floor
+        for item in self.counts.keys() - other.counts.keys():
+            self.counts[item] += other.floor
+            self.errors[item] += other.floor
+
+        for item, count in other.counts.items():
+            if item in self.counts:
+                self.counts[item] += count
+                self.errors[item] += other.errors[item]
+            else:
+                self.counts[item] = count + self.floor
+                self.errors[item] = other.errors[item] + self.floor
+
+        self.floor += other.floor
+
+        if len(self.counts) > self.capacity:
+            self._prune()
+
+        return self
+
+    def top(self, k: int = TOP_K) -> list:
+        return heapq.nlargest(k, self.counts.items(), key=lambda i: (i[1], i[0]))
+
+    def to_dict(self, k: int = TOP_K) -> dict:
+        """Serializes the `k` most frequent items to a JSON friendly representation"""
+        top = self.top(k + 1)
+
+        # items left out of the serialized summary are bounded by the largest of them
+        floor = self.floor
+        if len(top) > k:
+            floor = max(floor, top.pop()[1])
+
+        return {
+            "floor": floor,
+            "terms": [
+                {"term": item, "count": count, "error": self.errors[item]}
+                for item, count in top
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, capacity: int = CAPACITY) -> "SpaceSaving":
+        sketch = cls(capacity)
+        sketch.floor = data["floor"]
+
+        for e in data["terms"]:
+            sketch.counts[e["term"]] = e["count"]
+            sketch.errors[e["term"]] = e["error"]
+
+        return sketch
+
+    def _prune(self):
+        kept = dict(self.top(self.capacity))
+        evicted = max(
+            (c for i, c in self.counts.items() if i not in kept), default=0
+        )
+
+        self.floor = max(self.floor, evicted)
+        self.counts = kept
+        self.errors = {i: self.errors[i] for i in kept}
+
+
+def merge_summaries(summaries, k: int = TOP_K) -> dict:
+    """Merges serialized summaries (as produced by `SpaceSaving.to_dict`) into a single one"""
+    merged = SpaceSaving()
+
+    for data in summaries:
+        merged.merge(SpaceSaving.from_dict(data))
+
+    return merged.to_dict(k)
@@ -0,0 +1,68 @@
+"""
+Reports the most common classes, properties and subjects of the whole collection.
+It merges the summaries stored by `extract.py` and `extract_stream.py` inside each `metadata.json`,
+so the extracted text files are not read again.
+"""
+
+import os
+import json
+import argparse
+from sketches import TOP_K, merge_summaries
+
+SUMMARY_KEYS = ["topClasses", "topProperties", "topSubjects"]
+
+
+def dataset_summaries(dataset_folder: str) -> dict:
+    """Merges the summaries of all the files extracted from a dataset"""
+    metadata_file = f"{dataset_folder}/metadata.json"
+
+    summaries = {k: list() for k in SUMMARY_KEYS}
+
+    if not os.path.isfile(metadata_file):
+        return {k: merge_summaries(v) for k, v in summaries.items()}
+
+    with open(metadata_file, "r") as f:
+        metadata = json.load(f, strict=False)
+
+    for item in metadata.get("extracted", list()):
+        for k in SUMMARY_KEYS:
+            if k in item.keys():
+                summaries[k].append(item[k])
+
+    return {k: merge_summaries(v) for k, v in summaries.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", type=str, help="Folder in which datasets are stored")
+    parser.add_argument(
+        "--top", type=int, default=TOP_K, help="Number of terms reported per summary"
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="Write the report to a JSON file"
+    )
+    args = parser.parse_args()
+
+    datasets_folder = args.folder
+
+    collection = {k: list() for k in SUMMARY_KEYS}
+
+    for dataset in sorted(os.listdir(datasets_folder)):
+        # hidden folders (e.g. `.shards`) are not datasets
+        if dataset.startswith("."):
+            continue
+
+        summaries = dataset_summaries(f"{datasets_folder}/{dataset}")
+        for k in SUMMARY_KEYS:
+            collection[k].append(summaries[k])
+
+    report = {k: merge_summaries(v, args.top) for k, v in collection.items()}
+
+    if args.output is not None:
+        with open(args.output, "w") as out:
+            out.write(json.dumps(report, ensure_ascii=False, indent=4))
+    else:
+        for k in SUMMARY_KEYS:
+            print(f"# {k}")
+            for e in report[k]["terms"]:
+                print(f"{e['count']:>12} {e['term']}")
@@ -0,0 +1,131 @@
+"""
+Turns the triples of an RDF file into "subject predicate object" sentences that can be used as input of a language model.
+Triples are read as a stream and sentences are grouped in chunks that do not exceed a given token budget,
+so files that cannot be loaded into RDFLib can be processed with constant memory.
+"""
+
+import argparse
+from functools import lru_cache
+
+# Approximate number of tokens of each chunk
+TOKEN_BUDGET = 512
+
+# Number of cleaned terms kept in memory
+CACHE_SIZE = 100_000
+
+
+def iter_triples(file_path: str, engine: str = "lightrdf"):
+    """Yields the triples of the file as tuples of strings using the given engine"""
+    if engine == "lightrdf":
+        import lightrdf
+
+        doc = lightrdf.RDFDocument(file_path)
+        for s, p, o in doc.search_triples(None, None, None):
+            yield normalize_term(s), normalize_term(p), normalize_term(o)
+
+    elif engine == "rdflib":
+        from rdflib import Graph
+
+        graph = Graph()
+        graph.parse(file_path)
+        for s, p, o in graph:
+            yield str(s), str(p), str(o)
+
+    else:
+        raise ValueError(f"Engine {engine} is not supported")
+
+
+def normalize_term(term: str) -> str:
+    """Converts a term in N-Triples syntax (as returned by lightrdf) to its value, as RDFLib does:
+    IRIs without `<>`, literals without quotes, datatype and language tag, blank nodes without `_:`
+    """
+    if term.startswith("<") and term.endswith(">"):
+        return term[1:-1]
+
+    if term.startswith('"'):
+        end = term.rfind('"')
+        if end > 0:
+            return term[1:end].replace('\\"', '"')
+
+    # blank nodes
+    if term.startswith("_:"):
+        return term[2:]
+
+    return term
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def string_cleaner(term: str) -> str:
+    return term.split("/")[-1].replace("#", "").replace(".", " ").replace("_", " ")
+
+
+def is_majority_numbers(string: str) -> bool:
+    if not string:
+        return False
+    numbers_count = sum(char.isdigit() for char in string)
+    percentage = numbers_count / len(string)
+    return percentage > 0.5
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def is_numeric_term(term: str) -> bool:
+    return is_majority_numbers(term)
+
+
+def sentences(triples):
+    """Yields a sentence for each triple whose subject and object are not mostly numbers"""
+    for subj, pred, obj in triples:
+        cs = string_cleaner(subj)
+        co = string_cleaner(obj)
+
+        if is_numeric_term(cs) or is_numeric_term(co):
+            continue
+
+        yield f"{cs} {string_cleaner(pred)} {co}"
+
+
+def chunks(triples, token_budget: int = TOKEN_BUDGET):
+    """Groups the sentences in strings whose number of tokens does not exceed the budget.
+
+    Tokens are approximated with the number of whitespace separated words,
+    a sentence longer than the budget is emitted as a chunk on its own.
+    """
+    chunk = list()
+    tokens = 0
+
+    for sentence in sentences(triples):
+        length = len(sentence.split())
+
+        if tokens + length > token_budget and len(chunk) > 0:
+            yield " ".join(chunk)
+            chunk = list()
+            tokens = 0
+
+        chunk.append(sentence)
+        tokens += length
+
+    if len(chunk) > 0:
+        yield " ".join(chunk)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", type=str, help="RDF file to verbalize")
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default="lightrdf",
+        choices=["lightrdf", "rdflib"],
+        help="Library used to read the triples",
+    )
+    parser.add_argument(
+        "--tokens",
+        type=int,
+        default=TOKEN_BUDGET,
+        help="Approximate number of tokens of each chunk",
+    )
+    args = parser.parse_args()
+
+    # print a chunk per line
+    for chunk in chunks(iter_triples(args.file, args.engine), args.tokens):
+        print(chunk)
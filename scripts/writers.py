@@ -0,0 +1,87 @@
+"""
+Writers that move the output of the extraction to a dedicated thread.
+
+Lines are collected in batches by the parsing loop and handed over through a bounded queue,
+a writer thread joins each batch and writes it at once (optionally compressing it),
+so that parsing does not wait for the disk.
+"""
+
+import gzip
+import queue
+import threading
+
+# Number of lines handed over to the writer thread at once
+BATCH_SIZE = 10_000
+
+# Number of batches waiting to be written before the parsing loop is blocked
+QUEUE_SIZE = 16
+
+# Size of the buffer of the output file
+BUFFER_SIZE = 1024 * 1024  # 1 MB
+
+
+def output_name(name: str, compress: bool) -> str:
+    return f"{name}.gz" if compress else name
+
+
+class BatchedWriter:
+    def __init__(
+        self,
+        path: str,
+        compress: bool = False,
+        batch_size: int = BATCH_SIZE,
+        queue_size: int = QUEUE_SIZE,
+    ):
+        if compress:
+            self.file = gzip.open(path, "wt", compresslevel=6)
+        else:
+            self.file = open(path, "w+", buffering=BUFFER_SIZE)
+
+        self.batch = list()
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, line: str):
+        self.batch.append(line)
+
+        if len(self.batch) >= self.batch_size:
+            self.queue.put(self.batch)
+            self.batch = list()
+
+    def close(self):
+        if len(self.batch) > 0:
+            self.queue.put(self.batch)
+            self.batch = list()
+
+        # signal the writer thread that no more batches are coming
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+
+            # keep consuming after an error so that the parsing loop is never blocked
+            if self.error is not None:
+                continue
+
+            try:
+                self.file.write("\n".join(batch) + "\n")
+            except Exception as e:
+                self.error = e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
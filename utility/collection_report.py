@@ -0,0 +1,263 @@
+"""
+Summarizes the status of the collection, as done in `data-analysis/analysis.ipynb`, without opening every file by hand.
+
+Dataset folders are scanned in parallel, the information read from each `metadata.json` is cached
+(keyed by its modification time) so that only the datasets that changed are parsed again.
+
+It reports:
+1) the classification of the datasets in EMPTY / PARTIAL / COMPLETE
+2) a histogram of the sizes of the files (files written by the extraction are not counted)
+3) number of files and bytes for each format
+4) a summary of download and parsing failures
+"""
+
+import os
+import csv
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+RDF_SUFFIXES = ["rdf", "ttl", "owl", "n3", "nt", "jsonld", "nq", "trig", "trix"]
+
+SIZE_LIMIT = 200 * 1024 * 1024  # 200 MB
+
+# Upper bounds of the buckets of the size histogram
+SIZE_BUCKETS = [
+    ("<1KB", 1024),
+    ("<1MB", 1024**2),
+    ("<10MB", 10 * 1024**2),
+    ("<200MB", SIZE_LIMIT),
+    ("<1GB", 1024**3),
+    (">=1GB", None),
+]
+
+CACHE_FILE = "collection_report_cache.json"
+
+# Changes when the content of the cache changes, older caches are ignored
+CACHE_VERSION = 2
+
+# Keys of `extracted` entries (and of `metadata.json`) that reference files written by the extraction
+OUTPUT_KEYS = [
+    "classesFile",
+    "literalsFile",
+    "entitiesFile",
+    "propertiesFile",
+    "schemaFile",
+]
+
+
+def size_bucket(size: int) -> str:
+    for name, limit in SIZE_BUCKETS:
+        if limit is None or size < limit:
+            return name
+
+
+def file_format(name: str) -> str:
+    ext = name.split(".")[-1].lower()
+    return ext if ext in RDF_SUFFIXES else "other"
+
+
+def classify(metadata: dict) -> str:
+    # check if the dataset has been downloaded completely
+    error_while_downloading = len(metadata["failedURLs"]) > 0
+
+    # check if the file dataset contains at least one file that has been parsed
+    contains_a_valid_file = len(metadata["extracted"]) > 0
+
+    # check if the dataset has some files that have not been parsed or has thrown errors while parsing
+    error_while_parsing = len(metadata["unusedFiles"]) > 0
+
+    if contains_a_valid_file and not error_while_downloading and not error_while_parsing:
+        return "COMPLETE"
+
+    if contains_a_valid_file:
+        return "PARTIAL"
+
+    return "EMPTY"
+
+
+def read_metadata(metadata_file: str) -> dict:
+    """Keeps only the parts of `metadata.json` used by the report"""
+    with open(metadata_file, "r") as f:
+        metadata = json.load(f, strict=False)
+
+    # files written by the extraction are not part of the dataset
+    outputs = [metadata[k] for k in OUTPUT_KEYS if k in metadata.keys()]
+    for e in metadata.get("extracted", list()):
+        outputs.extend(e[k] for k in OUTPUT_KEYS if k in e.keys())
+
+    summary = {
+        "outputs": outputs,
+        "failedURLs": metadata.get("failedURLs", list()),
+        "extracted": [e["file"] for e in metadata.get("extracted", list())],
+        "unusedFiles": [e["file"] for e in metadata.get("unusedFiles", list())],
+    }
+    summary["status"] = classify(summary)
+
+    return summary
+
+
+def scan_dataset(dataset_folder: str, cached: dict) -> dict:
+    files = list()
+    metadata = None
+    mtime = None
+
+    with os.scandir(dataset_folder) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+
+            stat = entry.stat()
+
+            if entry.name == "metadata.json":
+                mtime = stat.st_mtime_ns
+                continue
+
+            files.append({"name": entry.name, "size": stat.st_size})
+
+    if mtime is not None:
+        if cached is not None and cached["mtime"] == mtime:
+            metadata = cached["metadata"]
+        else:
+            metadata = read_metadata(f"{dataset_folder}/metadata.json")
+
+    if metadata is not None:
+        outputs = set(metadata["outputs"])
+        files = [f for f in files if f["name"] not in outputs]
+
+    return {"mtime": mtime, "metadata": metadata, "files": files}
+
+
+def build_report(records: dict) -> tuple:
+    statuses = {"EMPTY": 0, "PARTIAL": 0, "COMPLETE": 0, "MISSING_METADATA": 0}
+    histogram = {name: 0 for name, _ in SIZE_BUCKETS}
+    formats = dict()
+    failures = {
+        "datasetsWithFailedURLs": 0,
+        "failedURLs": 0,
+        "datasetsWithUnusedFiles": 0,
+        "unusedRDFFiles": 0,
+        "unusedOtherFiles": 0,
+        "bigUnusedFiles": 0,
+    }
+    rows = list()
+
+    for dataset, record in records.items():
+        metadata = record["metadata"]
+        sizes = {f["name"]: f["size"] for f in record["files"]}
+
+        for name, size in sizes.items():
+            histogram[size_bucket(size)] += 1
+
+            fmt = formats.setdefault(file_format(name), {"files": 0, "size": 0})
+            fmt["files"] += 1
+            fmt["size"] += size
+
+        if metadata is None:
+            statuses["MISSING_METADATA"] += 1
+            status = "MISSING_METADATA"
+        else:
+            status = metadata["status"]
+            statuses[status] += 1
+
+            if len(metadata["failedURLs"]) > 0:
+                failures["datasetsWithFailedURLs"] += 1
+                failures["failedURLs"] += len(metadata["failedURLs"])
+
+            if len(metadata["unusedFiles"]) > 0:
+                failures["datasetsWithUnusedFiles"] += 1
+
+            for file in metadata["unusedFiles"]:
+                if file_format(file) == "other":
+                    failures["unusedOtherFiles"] += 1
+                else:
+                    failures["unusedRDFFiles"] += 1
+
+                if sizes.get(file, 0) >= SIZE_LIMIT:
+                    failures["bigUnusedFiles"] += 1
+
+        rows.append(
+            {
+                "dataset": dataset,
+                "status": status,
+                "files": len(sizes),
+                "size": sum(sizes.values()),
+                "extracted": 0 if metadata is None else len(metadata["extracted"]),
+                "unusedFiles": 0 if metadata is None else len(metadata["unusedFiles"]),
+                "failedURLs": 0 if metadata is None else len(metadata["failedURLs"]),
+            }
+        )
+
+    report = {
+        "datasets": len(records),
+        "status": statuses,
+        "sizeHistogram": histogram,
+        "formats": formats,
+        "failures": failures,
+    }
+
+    return report, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", type=str, help="Folder in which datasets are stored")
+    parser.add_argument(
+        "--json", type=str, default=None, help="Write the report to a JSON file"
+    )
+    parser.add_argument(
+        "--csv", type=str, default=None, help="Write a row per dataset to a CSV file"
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=CACHE_FILE,
+        help="File in which the parsed metadata are cached",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=32, help="Number of folders scanned in parallel"
+    )
+    args = parser.parse_args()
+
+    datasets_folder = args.folder
+
+    cache = dict()
+    if os.path.isfile(args.cache):
+        with open(args.cache, "r") as f:
+            cache = json.load(f)
+
+        if cache.pop("version", None) != CACHE_VERSION:
+            cache = dict()
+
+    with os.scandir(datasets_folder) as entries:
+        datasets = sorted(
+            e.name for e in entries if e.is_dir() and not e.name.startswith(".")
+        )
+
+    # scanning is I/O bound so threads are enough
+    with ThreadPoolExecutor(args.workers) as executor:
+        scanned = executor.map(
+            lambda d: scan_dataset(f"{datasets_folder}/{d}", cache.get(d)), datasets
+        )
+        records = dict(zip(datasets, scanned))
+
+    with open(args.cache, "w") as f:
+        cache = {d: {"mtime": r["mtime"], "metadata": r["metadata"]} for d, r in records.items()}
+        cache["version"] = CACHE_VERSION
+        json.dump(cache, f)
+
+    report, rows = build_report(records)
+
+    if args.csv is not None:
+        with open(args.csv, "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=rows[0].keys() if rows else [])
+            writer.writeheader()
+            writer.writerows(rows)
+
+    content = json.dumps(report, indent=4)
+
+    if args.json is not None:
+        with open(args.json, "w") as out:
+            out.write(content)
+    else:
+        print(content)
@@ -6,12 +6,169 @@ It takes 3 command line arguments:
 1) The number of datasets to pick at random
 2) The input folder that contains the datasets
 3) The path of the output folder
+
+Datasets are stratified by total size, main format and number of files (read from an index that is built once
+and reused), then picked from each stratum with a fixed seed, so the same sample can be generated again.
+By default the same number of datasets is picked from each stratum, so that big datasets are represented.
+
+Files are hardlinked (or reflinked) instead of copied, so creating a sample is fast and takes almost no space.
+Only the files of the datasets are linked: `metadata.json` is copied, since the scripts rewrite it in place,
+while the outputs of a previous extraction are left out and removed from the copied `metadata.json`.
+
+The index is stored by default in the source folder, as a hidden file that the scripts do not treat as a dataset.
+It records the folder it describes and it is built again when it is used with a different one.
 """
 
 import os
-import argparse
-import shutil
+import json
+import errno
 import random
+import shutil
+import argparse
+from collection_report import OUTPUT_KEYS, file_format, scan_dataset, size_bucket
+
+INDEX_FILE = ".sample_index.json"
+
+# ioctl that clones a file on filesystems that support reflinks (Linux)
+FICLONE = 0x40049409
+
+
+def build_index(source_folder: str) -> dict:
+    index = dict()
+
+    for dataset in sorted(os.listdir(source_folder)):
+        dataset_folder = f"{source_folder}/{dataset}"
+        if dataset.startswith(".") or not os.path.isdir(dataset_folder):
+            continue
+
+        files = scan_dataset(dataset_folder, None)["files"]
+
+        # main format of the dataset by bytes, among the RDF ones
+        sizes = dict()
+        for f in files:
+            fmt = file_format(f["name"])
+            if fmt != "other":
+                sizes[fmt] = sizes.get(fmt, 0) + f["size"]
+
+        index[dataset] = {
+            "size": sum(f["size"] for f in files),
+            "files": len(files),
+            "format": max(sizes, key=lambda k: (sizes[k], k)) if sizes else "other",
+        }
+
+    return index
+
+
+def load_index(index_file: str, source_folder: str) -> dict:
+    """Returns the datasets of the stored index, None if it does not describe the source folder"""
+    if not os.path.isfile(index_file):
+        return None
+
+    with open(index_file, "r") as f:
+        index = json.load(f)
+
+    if index.get("source") != os.path.abspath(source_folder):
+        return None
+
+    return index["datasets"]
+
+
+def files_bucket(files: int) -> str:
+    if files <= 1:
+        return "1"
+    if files <= 5:
+        return "2-5"
+    return ">5"
+
+
+def stratum(entry: dict) -> str:
+    return f"{size_bucket(entry['size'])}|{entry['format']}|{files_bucket(entry['files'])}"
+
+
+def allocate(strata: dict, total: int, allocation: str) -> dict:
+    """Number of datasets to pick from each stratum"""
+    keys = sorted(strata.keys())
+    available = sum(len(v) for v in strata.values())
+    total = min(total, available)
+
+    if allocation == "proportional":
+        # largest remainder method
+        quotas = {k: total * len(strata[k]) / available for k in keys}
+        counts = {k: int(quotas[k]) for k in keys}
+        remainders = sorted(keys, key=lambda k: (counts[k] - quotas[k], k))
+        for k in remainders[: total - sum(counts.values())]:
+            counts[k] += 1
+        return counts
+
+    # same number for each stratum, what small strata cannot take goes to the others
+    counts = {k: 0 for k in keys}
+    remaining = total
+    while remaining > 0:
+        open_strata = [k for k in keys if counts[k] < len(strata[k])]
+        share = max(1, remaining // len(open_strata))
+
+        for k in open_strata:
+            take = min(share, len(strata[k]) - counts[k], remaining)
+            counts[k] += take
+            remaining -= take
+
+            if remaining == 0:
+                break
+
+    return counts
+
+
+def link_file(source: str, target: str, mode: str):
+    """Links the file in the given mode, falling back to a copy when it is not supported"""
+    try:
+        if mode == "hardlink":
+            os.link(source, target)
+            return
+
+        if mode == "reflink":
+            import fcntl
+
+            with open(source, "rb") as src, open(target, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+
+    except OSError as e:
+        if e.errno == errno.EEXIST:
+            os.remove(target)
+            return link_file(source, target, mode)
+
+    shutil.copy2(source, target)
+
+
+def is_output(file: str) -> bool:
+    # schema summaries that are not referenced by `metadata.json` (e.g. left by an interrupted extraction)
+    return file == "metadata.schema.json" or file.endswith("-schema.json")
+
+
+def copy_metadata(source: str, target: str):
+    """Copies `metadata.json` without the references to the outputs of the extraction, which are not part of the sample"""
+    with open(source, "r") as f:
+        metadata = json.load(f, strict=False)
+
+    for item in [metadata, *metadata.get("extracted", list())]:
+        for k in OUTPUT_KEYS:
+            item.pop(k, None)
+
+    with open(target, "w") as out:
+        out.write(json.dumps(metadata, ensure_ascii=False, indent=4))
+
+
+def materialize(source_path: str, target_path: str, mode: str):
+    os.makedirs(target_path, exist_ok=True)
+
+    if os.path.isfile(f"{source_path}/metadata.json"):
+        copy_metadata(f"{source_path}/metadata.json", f"{target_path}/metadata.json")
+
+    # files of the dataset, without hidden files and the outputs listed in `metadata.json`
+    for f in scan_dataset(source_path, None)["files"]:
+        if not is_output(f["name"]):
+            link_file(f"{source_path}/{f['name']}", f"{target_path}/{f['name']}", mode)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -22,23 +179,78 @@ if __name__ == "__main__":
     parser.add_argument(
         "target", type=str, help="Folder in which datasets will be stored"
     )
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the sampling")
+    parser.add_argument(
+        "--index",
+        type=str,
+        default=None,
+        help=f"Index of the collection, built if it does not exist (default: {INDEX_FILE} in the source folder)",
+    )
+    parser.add_argument(
+        "--rebuild-index",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Build the index again even if it exists",
+    )
+    parser.add_argument(
+        "--allocation",
+        type=str,
+        default="equal",
+        choices=["equal", "proportional"],
+        help="Pick the same number of datasets from each stratum or proportionally to its size",
+    )
+    parser.add_argument(
+        "--link",
+        type=str,
+        default="hardlink",
+        choices=["hardlink", "reflink", "copy"],
+        help="How files are placed in the target folder",
+    )
     args = parser.parse_args()
 
     pick_datasets = args.datasets
     source_folder = args.source
     target_folder = args.target
 
-    datasets = os.listdir(source_folder)
-    random.shuffle(datasets)
+    index_file = args.index
+    if index_file is None:
+        index_file = f"{source_folder}/{INDEX_FILE}"
+
+    index = None
+    if not args.rebuild_index:
+        index = load_index(index_file, source_folder)
+
+    if index is None:
+        index = build_index(source_folder)
+        with open(index_file, "w") as f:
+            content = {"source": os.path.abspath(source_folder), "datasets": index}
+            f.write(json.dumps(content, indent=4))
+
+    # datasets removed after the index has been built cannot be picked
+    missing = [d for d in index.keys() if not os.path.isdir(f"{source_folder}/{d}")]
+    if len(missing) > 0:
+        print(
+            f"WARNING: {len(missing)} datasets of the index are missing from {source_folder}, "
+            "use --rebuild-index to update it"
+        )
+        for dataset in missing:
+            del index[dataset]
+
+    strata = dict()
+    for dataset, entry in index.items():
+        strata.setdefault(stratum(entry), list()).append(dataset)
+
+    counts = allocate(strata, pick_datasets, args.allocation)
+
+    rng = random.Random(args.seed)
 
-    i = 0
-    while i < pick_datasets:
-        dataset_id = datasets[i]
+    for key in sorted(strata.keys()):
+        picked = rng.sample(sorted(strata[key]), counts[key])
 
-        source_path = os.path.join(f"{source_folder}/{dataset_id}")
-        target_path = os.path.join(f"{target_folder}/{dataset_id}")
+        print(f"{key}: {counts[key]}/{len(strata[key])}")
 
-        if os.path.isdir(source_path):
-            shutil.copytree(source_path, target_path, dirs_exist_ok=True)
+        for dataset_id in picked:
+            source_path = os.path.join(f"{source_folder}/{dataset_id}")
+            target_path = os.path.join(f"{target_folder}/{dataset_id}")
 
-        i += 1
+            materialize(source_path, target_path, args.link)